@@ -0,0 +1,249 @@
+"""
+This module has a small benchmark suite for the hot paths of the game. It
+generates synthetic levels using the same CSV layout as the real ones (one
+folder with background, foreground and colliders files) and times how each
+subsystem behaves as the levels grow.
+
+Run it from the root of the project, as the player spritesheet is loaded using
+the same relative paths the game uses:
+
+    python benchmark.py --columns 25 100 1000 10000 --output bench.json
+
+The results are saved as JSON so different runs can be compared later.
+"""
+
+import os
+
+# Make sure pygame does not try to open a real window or sound device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import csv
+import json
+import platform
+import random
+import tempfile
+import time
+
+from typing import Callable, Dict, List
+
+import pygame
+import constants
+
+from tiles import Tileset
+from maps import Map, MapLayer
+from player import Player
+from snapshots import SnapshotBuffer
+from memory import MemoryReport
+
+# Default values for the benchmark parameters
+DEFAULT_COLUMNS = [25, 100, 1000, 10000]
+DEFAULT_ROWS = 12
+DEFAULT_DENSITY = 0.2
+DEFAULT_TILE_COUNT = 96
+DEFAULT_MIN_TIME = 0.2 # Minimum time (in seconds) spent running each case
+
+
+def generate_level(folder:str, columns:int, rows:int = DEFAULT_ROWS, density:float = DEFAULT_DENSITY, tile_count:int = DEFAULT_TILE_COUNT, seed:int = 0):
+    """
+    Will write a synthetic level inside the folder provided. The level has a
+    solid floor on the second to last row (just like level 1) and the rest of
+    the cells are filled randomly based on the density, which goes from 0 to
+    1. Returns a dictionary with the paths of the three layers.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    paths = {}
+    for layer in ("background", "foreground", "colliders"):
+        grid = []
+        for row_pos in range(rows):
+            # Keep the floor solid on the collision layer so the player has
+            # somewhere to stand
+            if layer == "colliders" and row_pos == rows - 2:
+                grid.append(["0"] * columns)
+                continue
+
+            row = []
+            for column_pos in range(columns):
+                if rng.random() < density:
+                    row.append(str(rng.randrange(tile_count)))
+                else:
+                    row.append("")
+            grid.append(row)
+
+        paths[layer] = os.path.join(folder, layer + ".csv")
+        with open(paths[layer], "w", newline="") as file:
+            csv.writer(file).writerows(grid)
+
+    return paths
+
+
+def generate_tileset(filename:str, tiles_x:int, tiles_y:int, tilesize:int = constants.TILESIZE):
+    """
+    Will write a synthetic tileset image with tiles_x * tiles_y tiles.
+    """
+    image = pygame.Surface((tiles_x * tilesize, tiles_y * tilesize), pygame.SRCALPHA)
+    for x in range(tiles_x):
+        for y in range(tiles_y):
+            color = ((x * 37) % 256, (y * 53) % 256, ((x + y) * 17) % 256, 255)
+            image.fill(color, (x * tilesize, y * tilesize, tilesize, tilesize))
+    pygame.image.save(image, filename)
+
+
+def measure(function:Callable, min_time:float = DEFAULT_MIN_TIME):
+    """
+    Will call the function repeatedly for at least min_time seconds and return
+    a dictionary with the timing results (in seconds).
+    """
+    timings = []
+    started = time.perf_counter()
+    while True:
+        begin = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - begin)
+        if time.perf_counter() - started >= min_time:
+            break
+
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "min": timings[0],
+        "median": timings[len(timings) // 2],
+        "mean": sum(timings) / len(timings),
+    }
+
+
+def bench_level(paths:Dict[str, str], tileset:Tileset, columns:int, min_time:float):
+    """
+    Will run the level related benchmarks (parsing, colliders, rendering and
+    player collisions) for a single level.
+    """
+    results = {}
+
+    # Parsing the CSV files
+    results["maplayer_init"] = measure(lambda: MapLayer(paths["background"], tileset), min_time)
+    results["maplayer_init_colliders"] = measure(lambda: MapLayer(paths["colliders"], tileset, True), min_time)
+
+    # Building the colliders alone (it is a private method, so we need to use
+    # the mangled name)
+    layer = MapLayer(paths["colliders"], tileset, True)
+    results["parse_colliders"] = measure(lambda: layer._MapLayer__parse_colliders(layer.tiles), min_time)
+    results["collider_count"] = len(layer.colliders)
+
+    # Reloading a file that did not change (parsing plus the row diff)
+    results["reload"] = measure(layer.reload, min_time)
+
+    # Rendering at the start, middle and end of the level
+    level_width = columns * constants.TILESIZE
+    max_anchor = max(level_width - constants.SCREEN_SIZE[0], 0)
+    screen = pygame.Surface(constants.SCREEN_SIZE)
+    results["render"] = {}
+    for name, anchor_x in (("start", 0), ("middle", max_anchor // 2), ("end", max_anchor)):
+        results["render"][name] = measure(lambda: layer.render(anchor_x, 0, constants.SCREEN_SIZE, screen), min_time)
+
+    # Scrolling render at different speeds (pixels per frame)
+    scrolling_layer = MapLayer(paths["colliders"], tileset, True, scrolling=True, background_color=constants.BACKGROUND_COLOR)
+    results["render_scrolling"] = {}
+    for speed in (0, 1, 8, 64):
+        state = {"anchor_x": 0}
+
+        def scroll():
+            state["anchor_x"] = (state["anchor_x"] + speed) % (max_anchor + 1)
+            scrolling_layer.render(state["anchor_x"], 0, constants.SCREEN_SIZE, screen)
+
+        results["render_scrolling"][str(speed)] = measure(scroll, min_time)
+
+    # Player collision passes against the whole level
+    level = Map()
+    level.colliders = layer
+    player = Player(constants.FILEPATH_CHARSET)
+
+    # Stand the player on the floor, so gravity pushes it into the floor and
+    # the contacts are resolved in every update
+    floor_y = (len(layer.tiles) - 2) * constants.TILESIZE
+
+    def update_player():
+        player.pos_x = constants.SCREEN_SIZE[0] / 2
+        player.pos_y = floor_y - constants.PLAYER_SIZE
+        player.update(level, max_anchor // 2, 0)
+
+    results["player_update"] = measure(update_player, min_time)
+
+    # Memory used by the collision layers (without the tileset) and the
+    # player. The scrolling layer has already rendered, so its backbuffer is
+    # counted too.
+    report = MemoryReport()
+    report.seen.add(id(tileset))
+    report.add("layer", "colliders", layer)
+    report.add("layer", "colliders_scrolling", scrolling_layer)
+    report.add_player("player", player)
+    results["memory"] = report.to_dict()
+
+    # Taking and restoring snapshots should not depend on the level size, but
+    # it is kept here to compare against the update cost
+    snapshots = SnapshotBuffer(constants.REWIND_SECONDS, constants.TICK_RATE)
+    results["snapshot_push"] = measure(lambda: snapshots.push(player, max_anchor // 2, 0), min_time)
+    results["snapshot_restore"] = measure(lambda: snapshots.restore(player), min_time)
+
+    return results
+
+
+def run(columns:List[int], rows:int = DEFAULT_ROWS, density:float = DEFAULT_DENSITY, min_time:float = DEFAULT_MIN_TIME):
+    """
+    Will run the whole benchmark suite and return the results as a dictionary
+    that can be dumped as JSON.
+    """
+    pygame.init()
+
+    results = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "rows": rows,
+        "density": density,
+        "min_time": min_time,
+        "tileset": {},
+        "levels": {},
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        # Tileset loading for a few sheet sizes
+        for tiles_side in (4, 8, 16):
+            filename = os.path.join(folder, "tileset_%d.png" % tiles_side)
+            generate_tileset(filename, tiles_side, tiles_side)
+            results["tileset"][str(tiles_side * tiles_side)] = measure(lambda: Tileset(filename, constants.TILESIZE), min_time)
+
+        # The levels use a tileset big enough for every generated index
+        filename = os.path.join(folder, "tileset_level.png")
+        generate_tileset(filename, 12, 8)
+        tileset = Tileset(filename, constants.TILESIZE)
+
+        for column_count in columns:
+            paths = generate_level(os.path.join(folder, "level_%d" % column_count), column_count, rows, density, len(tileset.sprites))
+            results["levels"][str(column_count)] = bench_level(paths, tileset, column_count, min_time)
+            print("Finished %d columns" % column_count)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the game microbenchmarks.")
+    parser.add_argument("--columns", type=int, nargs="+", default=DEFAULT_COLUMNS, help="level widths to test")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="level height")
+    parser.add_argument("--density", type=float, default=DEFAULT_DENSITY, help="chance of a cell having a tile")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="minimum seconds spent per case")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    results = run(args.columns, args.rows, args.density, args.min_time)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print("Results written to %s" % args.output)
+
+
+if __name__ == "__main__":
+    main()
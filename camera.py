@@ -0,0 +1,101 @@
+"""
+This module has the camera, which defines what part of the level is shown on
+the screen. The camera position is the anchor used when rendering the map
+layers and when testing collisions, as the player position is relative to the
+screen. Each layer has a parallax factor that defines how fast it scrolls
+compared to the camera: 1 moves with the level, less than 1 moves slower (good
+for backgrounds that look far away).
+
+It also has the culling helper used by every renderer to find the tiles that
+are inside the screen.
+"""
+
+import math
+
+from typing import Tuple
+
+
+def get_visible_tiles(anchor_x:float, anchor_y:float, area:Tuple[int, int, int, int], tilesize:int, rows:int, columns:int):
+    """
+    Returns the tiles that touch an area of the screen as a tuple with the
+    (start_x, end_x, start_y, end_y) range of columns and rows (the end is not
+    included). The area is a (left, top, width, height) tuple in screen
+    coordinates and the anchor is the position of the screen in the layer. The
+    ranges are clamped to the size of the layer, so they may be empty.
+    """
+    left, top, width, height = area
+
+    # Tiles are drawn at whole pixels
+    anchor_x = math.floor(anchor_x)
+    anchor_y = math.floor(anchor_y)
+
+    start_x = max((anchor_x + left) // tilesize, 0)
+    end_x = min((anchor_x + left + width - 1) // tilesize + 1, columns)
+    start_y = max((anchor_y + top) // tilesize, 0)
+    end_y = min((anchor_y + top + height - 1) // tilesize + 1, rows)
+
+    return start_x, max(end_x, start_x), start_y, max(end_y, start_y)
+
+
+class Camera:
+    """
+    Stores the camera position and the limits it can scroll to. The limits come
+    from the size of the level, so the camera never shows what is outside of
+    it.
+    """
+
+    def __init__(self, screen_size:Tuple[int, int]):
+        # Store values
+        self.screen_size: Tuple[int, int] = screen_size
+
+        # Position of the top left corner of the screen in the level
+        self.x = 0
+        self.y = 0
+
+        # How far the camera can scroll
+        self.max_x = 0
+        self.max_y = 0
+
+    def set_bounds(self, level_width:int, level_height:int):
+        """
+        Will set how far the camera can scroll for a level of the size
+        provided (in pixels).
+        """
+        self.max_x = max(level_width - self.screen_size[0], 0)
+        self.max_y = max(level_height - self.screen_size[1], 0)
+        self.clamp()
+
+    def fit_map(self, map):
+        """
+        Will set the bounds using the size of the layers of a map that scroll
+        with the level (parallax of 1).
+        """
+        width = 0
+        height = 0
+        for layer in map.get_layers():
+            if layer.parallax != 1:
+                continue
+            width = max(width, layer.get_width())
+            height = max(height, layer.get_height())
+
+        self.set_bounds(width, height)
+
+    def clamp(self):
+        """
+        Will keep the camera inside the bounds.
+        """
+        self.x = min(max(self.x, 0), self.max_x)
+        self.y = min(max(self.y, 0), self.max_y)
+
+    def get_layer_anchor(self, layer):
+        """
+        Returns the anchor of a layer, taking the parallax into account.
+        """
+        return self.x * layer.parallax, self.y * layer.parallax
+
+    def render(self, layer, surface):
+        """
+        Will render a layer as seen by the camera.
+        """
+        anchor_x, anchor_y = self.get_layer_anchor(layer)
+        layer.render(anchor_x, anchor_y, self.screen_size, surface)
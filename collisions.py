@@ -9,6 +9,70 @@ COLLISION_BOTTOM = 2
 COLLISION_LEFT = 3
 COLLISION_RIGHT = 4
 
+class Contact:
+    """
+    A single contact between a bounding box and another one. It stores the
+    side that is colliding, how deep the boxes are overlapping on that side and
+    the rectangle of the other box. Contacts are owned by a ContactManifold and
+    reused every frame, so they should not be stored elsewhere.
+    """
+    __slots__ = ("collision_type", "offset", "left", "top", "width", "heigth")
+
+    def __init__(self):
+        self.collision_type = 0
+        self.offset = 0
+        self.left = 0
+        self.top = 0
+        self.width = 0
+        self.heigth = 0
+
+    def rect(self):
+        """
+        Returns the rectangle of the other box as a (left, top, width, heigth)
+        tuple, which is what pygame.Rect expects.
+        """
+        return (self.left, self.top, self.width, self.heigth)
+
+    def __repr__(self):
+        return "Contact(%d, %s, %s)" % (self.collision_type, self.offset, self.rect())
+
+class ContactManifold:
+    """
+    A preallocated buffer of contacts. Clearing the manifold does not release
+    the Contact objects, it only resets the count, so the same objects are
+    filled again in the next frame instead of allocating new lists and tuples
+    for every collision. It grows if more contacts than expected show up.
+    """
+    __slots__ = ("contacts", "count")
+
+    def __init__(self, capacity:int = 16):
+        self.contacts = [Contact() for _ in range(capacity)]
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, collision_type:int, offset, left, top, width, heigth):
+        # Grow the buffer if needed
+        if self.count == len(self.contacts):
+            self.contacts.append(Contact())
+
+        contact = self.contacts[self.count]
+        contact.collision_type = collision_type
+        contact.offset = offset
+        contact.left = left
+        contact.top = top
+        contact.width = width
+        contact.heigth = heigth
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.contacts[i]
+
 class BoundingBox:
     """
     Represents a bounding box and has a method to validate collisions. It is not
@@ -22,10 +86,11 @@ class BoundingBox:
         self.width = width
         self.heigth = heigth
 
-    def get_top_collision(self, pos_x, pos_y, other, other_pos_x, other_pos_y):
-        collisions = []
-
-        # Get the coordinates to test
+    def get_contacts(self, pos_x, pos_y, other, other_pos_x, other_pos_y, manifold:ContactManifold):
+        """
+        Tests all four sides against the other box in a single pass and writes
+        the contacts found into the manifold. Returns how many were added.
+        """
         # Get the boundaries of self
         self_left = pos_x
         self_right = pos_x + self.width
@@ -33,82 +98,63 @@ class BoundingBox:
         self_bottom = pos_y + self.heigth
 
         # Get the boundaries of other
+        other_width = other.width
+        other_heigth = other.heigth
         other_left = other_pos_x
-        other_right = other_pos_x + other.width
+        other_right = other_pos_x + other_width
         other_top = other_pos_y
-        other_bottom = other_pos_y + other.heigth
-
-        # Check if colliding at the bottom
-        if self_top < other_bottom and self_bottom > other_bottom and (self_left < other_right and self_right > other_left):
-            collisions.append((COLLISION_TOP, other_bottom - self_top, (other_left, other_top, 64, 64)))
-            pass
+        other_bottom = other_pos_y + other_heigth
 
-        return collisions
+        # Nothing to do if the boxes are not overlapping at all
+        if self_left >= other_right or self_right <= other_left or self_top >= other_bottom or self_bottom <= other_top:
+            return 0
 
-    def get_bottom_collision(self, pos_x, pos_y, other, other_pos_x, other_pos_y):
+        count = manifold.count
 
-        collisions = []
-
-        # Get the boundaries of self
-        self_left = pos_x
-        self_right = pos_x + self.width
-        self_top = pos_y
-        self_bottom = pos_y + self.heigth
-
-        # Get the boundaries of other
-        other_left = other_pos_x
-        other_right = other_pos_x + other.width
-        other_top = other_pos_y
-        other_bottom = other_pos_y + other.heigth
+        # Check if colliding at the top
+        if self_bottom > other_bottom:
+            manifold.add(COLLISION_TOP, other_bottom - self_top, other_left, other_top, other_width, other_heigth)
 
         # Check if colliding at the bottom
-        if self_bottom > other_top and self_top < other_top and (self_left < other_right and self_right > other_left):
-            collisions.append((COLLISION_BOTTOM, other_top - self_bottom, (other_left, other_top, 64, 64)))
+        if self_top < other_top:
+            manifold.add(COLLISION_BOTTOM, other_top - self_bottom, other_left, other_top, other_width, other_heigth)
 
-        return collisions
+        # Check if colliding at the left
+        if self_right > other_right:
+            manifold.add(COLLISION_LEFT, other_right - self_left, other_left, other_top, other_width, other_heigth)
 
-    def get_left_collision(self, pos_x:int, pos_y:int, other, other_pos_x:int, other_pos_y:int):
-        
-        collisions = []
+        # Check if colliding at the right
+        if self_left < other_left:
+            manifold.add(COLLISION_RIGHT, other_left - self_right, other_left, other_top, other_width, other_heigth)
 
-        # Get the coordinates to test
-        # Get the boundaries of self
-        self_left = pos_x
-        self_right = pos_x + self.width
-        self_top = pos_y
-        self_bottom = pos_y + self.heigth
-
-        # Get the boundaries of other
-        other_left = other_pos_x
-        other_right = other_pos_x + other.width
-        other_top = other_pos_y
-        other_bottom = other_pos_y + other.heigth
+        return manifold.count - count
 
-        # Check if colliding at the bottom
-        if self_left < other_right and self_right > other_right and (self_top < other_bottom and self_bottom > other_top):
-            collisions.append((COLLISION_LEFT, other_left - other_top, (other_left, other_top, 64, 64)))
-
-        return collisions
-
-    def get_right_collision(self, pos_x:int, pos_y:int, other, other_pos_x:int, other_pos_y:int):
-        
-        collisions = []
-
-        # Get the coordinates to test
+    def touches(self, pos_x, pos_y, contact:Contact):
+        """
+        Checks if a contact found earlier is still valid for the position
+        provided. This is used after snapping, as moving the box out of one
+        collider may also move it out of the others.
+        """
         # Get the boundaries of self
         self_left = pos_x
         self_right = pos_x + self.width
         self_top = pos_y
         self_bottom = pos_y + self.heigth
 
-        # Get the boundaries of other
-        other_left = other_pos_x
-        other_right = other_pos_x + other.width
-        other_top = other_pos_y
-        other_bottom = other_pos_y + other.heigth
-
-        # Check if colliding at the bottom
-        if self_right > other_left and self_left < other_left and (self_top < other_bottom and self_bottom > other_top):
-            collisions.append((COLLISION_RIGHT, other_left - other_top, (other_left, other_top, 64, 64)))
-
-        return collisions
+        # Get the boundaries of the contact
+        other_left = contact.left
+        other_right = contact.left + contact.width
+        other_top = contact.top
+        other_bottom = contact.top + contact.heigth
+
+        if self_left >= other_right or self_right <= other_left or self_top >= other_bottom or self_bottom <= other_top:
+            return False
+
+        collision_type = contact.collision_type
+        if collision_type == COLLISION_TOP:
+            return self_bottom > other_bottom
+        if collision_type == COLLISION_BOTTOM:
+            return self_top < other_top
+        if collision_type == COLLISION_LEFT:
+            return self_right > other_right
+        return self_left < other_left
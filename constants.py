@@ -4,8 +4,16 @@ Some constants used in the game.
 
 # Constants
 SCREEN_SIZE = (1024, 768) # Screen resolution
+BACKGROUND_COLOR = (100, 200, 255) # Color behind all the layers
 TILESIZE = 64 # Size of a single tile (it must be square)
 PLAYER_SIZE = 64 # Size of a single player animation frame
+TICK_RATE = 60 # Expected game ticks per second
+REWIND_SECONDS = 5 # How many seconds of snapshots are kept for rewinding
+HOT_RELOAD_INTERVAL = 0.5 # Seconds between checks of the level files
+MEMORY_BUDGET = 64 * 1024 * 1024 # Bytes the loaded assets are expected to use
+PIPELINED = False # Runs the simulation and the render in different threads
+BACKGROUND_PARALLAX = 1.0 # How fast the background scrolls compared to the level
+SCROLLING_RENDER = True # Layers below the player scroll the last frame instead of redrawing it
 
 # File names ---
 
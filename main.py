@@ -1,11 +1,17 @@
+import copy # Used to create the render copies of the player and camera
 import pygame # Pygame is our SDL wrapper
 import constants # This module carries the file names and static values
 
 from tiles import Tileset # Our main tileset class
 from maps import Map # Each map will be an instance of Map
+from camera import Camera # Will define what part of the map is on the screen
 from state import GameController # Will control the overall state of the game
 from state import InputController # Will handle the game input
 from player import Player # Will handle the player logic
+from snapshots import SnapshotBuffer, pack_snapshot, unpack_snapshot # Will store the states for rewinding and sharing between threads
+from watcher import LevelWatcher # Will reload the level when its files change
+from pipeline import Pipeline # Will run the simulation in its own thread
+from memory import MemoryReport # Will report how much memory the assets use
 
 # Some globals
 screen = None
@@ -15,9 +21,12 @@ main_tileset = None
 background_tileset = None
 map_level_1 = None
 player = None
+snapshots = None
+level_watcher = None
+camera = None
 
 def setup():
-    global screen, game_controller, input_controller, main_tileset, map_level_1, player
+    global screen, game_controller, input_controller, main_tileset, map_level_1, player, snapshots, level_watcher, camera
 
     # Initializes pygame
     pygame.init()
@@ -33,38 +42,55 @@ def setup():
     main_tileset = Tileset(constants.FILEPATH_TILESET_MAIN, constants.TILESIZE)
 
     # Load the maps
-    map_level_1 = Map()
-    map_level_1.load_background(constants.FILEPATH_LEVEL1_BACKGROUND, main_tileset)
+    map_level_1 = Map(constants.SCROLLING_RENDER, constants.BACKGROUND_COLOR)
+    map_level_1.load_background(constants.FILEPATH_LEVEL1_BACKGROUND, main_tileset, constants.BACKGROUND_PARALLAX)
     map_level_1.load_foreground(constants.FILEPATH_LEVEL1_FOREGROUND, main_tileset)
     map_level_1.load_colliders(constants.FILEPATH_LEVEL1_COLLIDERS, main_tileset)
 
+    # The camera can scroll over the whole level
+    camera = Camera(constants.SCREEN_SIZE)
+    camera.fit_map(map_level_1)
+
+    # Watch the level files for changes
+    level_watcher = LevelWatcher(map_level_1, constants.HOT_RELOAD_INTERVAL)
+
     # Load the player
     player = Player(constants.FILEPATH_CHARSET)
 
-anchor_x = 0
-anchor_y = 0
+    # Initializes the rewind buffer
+    snapshots = SnapshotBuffer(constants.REWIND_SECONDS, constants.TICK_RATE)
+
+    # Draw the first frame, so the scrolling backbuffers exist and are counted
+    render(camera, player)
+
+    # Report the memory used by the assets
+    memory_report = MemoryReport(constants.MEMORY_BUDGET)
+    memory_report.add_tileset("main", main_tileset)
+    memory_report.add_map("level_1", map_level_1)
+    memory_report.add_player("player", player)
+    print(memory_report)
+    memory_report.check()
 
 def game_loop():
-    global screen, map_level_1, game_controller, anchor_x, anchor_y, player
+    global screen, map_level_1, game_controller, input_controller, camera, player, snapshots, level_watcher
+
+    # Use the threaded loop if enabled
+    if constants.PIPELINED:
+        pipelined_game_loop()
+        return
 
     # Enter the main game loop
     while not game_controller.done:
 
-        # Paint the background
-        screen.fill((100,200,255))
+        # Reload the level if it has been edited
+        if level_watcher.poll():
+            camera.fit_map(map_level_1)
 
         # Handle logic
-        player.update(map_level_1, anchor_x, anchor_y)
+        simulate(input_controller)
 
-        # Render background and colliders
-        map_level_1.background.render(anchor_x, anchor_y, constants.SCREEN_SIZE, screen)
-        map_level_1.colliders.render(anchor_x, anchor_y, constants.SCREEN_SIZE, screen)
-
-        # Render player
-        player.render(screen)
-
-        # Render Foreground
-        map_level_1.foreground.render(anchor_x, anchor_y, constants.SCREEN_SIZE, screen)
+        # Render the map and the player
+        render(camera, player)
 
         # Check events and look for the exit event
         input()
@@ -76,8 +102,91 @@ def game_loop():
         pygame.display.flip()
 
 
+def pipelined_game_loop():
+    global screen, map_level_1, game_controller, input_controller, camera, player, level_watcher
+
+    # The input seen by the simulation thread. It is copied from the input
+    # controller once per tick, so it doesn't change in the middle of a tick.
+    tick_input = InputController()
+
+    # The render side uses a shallow copy of the player, which shares the
+    # sprites but gets its position and states from the state buffers
+    render_player = copy.copy(player)
+    render_camera = copy.copy(camera)
+
+    def simulate_tick(buffer):
+        simulate(tick_input)
+        handle_input(tick_input)
+        pack_snapshot(buffer, 0, player, camera.x, camera.y)
+
+    def render_tick(buffer):
+        render_camera.x, render_camera.y = unpack_snapshot(buffer, 0, render_player)
+        render(render_camera, render_player)
+        pygame.display.flip()
+
+    def swap():
+        # Both threads are waiting here, so the map can be changed safely
+        tick_input.copy_from(input_controller)
+        if level_watcher.poll():
+            camera.fit_map(map_level_1)
+            render_camera.max_x, render_camera.max_y = camera.max_x, camera.max_y
+
+    pipeline = Pipeline(simulate_tick, render_tick, swap)
+    pipeline.start()
+
+    # Stop the simulation thread even if something fails
+    try:
+        # Enter the main game loop
+        while not game_controller.done:
+
+            # Check events and look for the exit event
+            input_controller.update()
+            if input_controller.quit:
+                game_controller.done = True
+
+            # Draw the last tick while the next one is simulated
+            pipeline.frame()
+    finally:
+        pipeline.stop()
+
+
+def simulate(controller:InputController):
+    global map_level_1, camera, player, snapshots
+
+    # The snapshots are taken at the tick rate, as the loop is not paced
+    now = pygame.time.get_ticks()
+
+    # Handle logic, or go back in time while rewinding
+    if controller.rewind and len(snapshots):
+        anchor = snapshots.rewind_at(now, player)
+        if anchor is not None:
+            camera.x, camera.y = anchor
+    else:
+        player.update(map_level_1, camera.x, camera.y)
+        player.follow(camera)
+        snapshots.push_at(now, player, camera.x, camera.y)
+
+
+def render(tick_camera:Camera, tick_player:Player):
+    global screen, map_level_1
+
+    # Paint the background, unless the map already covers the screen
+    if not map_level_1.is_opaque():
+        screen.fill(constants.BACKGROUND_COLOR)
+
+    # Render background and colliders
+    tick_camera.render(map_level_1.background, screen)
+    tick_camera.render(map_level_1.colliders, screen)
+
+    # Render player
+    tick_player.render(screen)
+
+    # Render Foreground
+    tick_camera.render(map_level_1.foreground, screen)
+
+
 def input():
-    global input_controller, game_controller, anchor_x, anchor_y, player
+    global input_controller, game_controller
 
     # Update the input
     input_controller.update()
@@ -86,38 +195,48 @@ def input():
     if input_controller.quit:
         game_controller.done = True
 
-    if input_controller.left:
+    handle_input(input_controller)
+
+
+def handle_input(controller:InputController):
+    global camera, player
+
+    # The player can't move while rewinding
+    if controller.rewind:
+        return
+
+    if controller.left:
         #anchor_x -= 1
         #anchor_x = 0 if anchor_x < 0 else anchor_x
         player.face_left()
-        anchor_x, anchor_y = player.walk(anchor_x, anchor_y, 500, left=True)
+        player.walk(camera, left=True)
 
-    if input_controller.right:
+    if controller.right:
         #anchor_x += 1
         player.face_right()
-        anchor_x, anchor_y = player.walk(anchor_x, anchor_y, 500, right=True)
+        player.walk(camera, right=True)
 
-    if not (input_controller.right or input_controller.left):
+    if not (controller.right or controller.left):
         player.stand()
 
-    if input_controller.up:
+    if controller.up:
         pass
 
-    if input_controller.jump:
+    if controller.jump:
         player.start_jump()
 
-    if input_controller.down:
+    if controller.down:
         #anchor_y -= 1
         #anchor_y = 0 if anchor_y < 0 else anchor_y
         pass
 
 def debug():
-    global player, anchor_x, anchor_y, screen
-    print(player.pos_x, player.pos_y, anchor_x, anchor_y)
+    global player, camera, screen
+    print(player.pos_x, player.pos_y, camera.x, camera.y)
 
     # collisions
     for collision in player.col:
-        pygame.draw.rect(screen, pygame.Color(255,0,0), pygame.Rect(*(collision[2])))
+        pygame.draw.rect(screen, pygame.Color(255,0,0), pygame.Rect(*collision.rect()))
         print(collision)
 
 
@@ -8,12 +8,18 @@ import pygame
 import csv
 import math
 
-from typing import Tuple, List
+from typing import Tuple, List, Dict
 
 from pygame import Surface
 from tiles import Tileset
 from collisions import BoundingBox
-from constants import TILESIZE, SCREEN_SIZE
+from camera import get_visible_tiles
+from constants import TILESIZE
+
+class InvalidTileError(ValueError):
+    """
+    Raised when a reloaded layer has a cell that is not a tile of its tileset.
+    """
 
 class MapLayer:
     """
@@ -22,21 +28,41 @@ class MapLayer:
     This is used also to render the map in the screen.
     """
 
-    def __init__(self, filename:str, tileset:Tileset, is_collidable:bool = False):
+    def __init__(self, filename:str, tileset:Tileset, is_collidable:bool = False, scrolling:bool = False, parallax:float = 1.0, background_color:Tuple[int, int, int] = None):
         # Initialize values
         self.colliders: List[BoundingBox] = []
+        self.collider_cells: Dict[Tuple[int, int], BoundingBox] = {}
+        self.collider_indices: Dict[Tuple[int, int], int] = {}
         
         # Store values
         self.filename: str = filename
         self.is_collidable: bool = is_collidable
         self.tileset: Tileset = tileset
+        self.scrolling: bool = scrolling
+        self.parallax: float = parallax
+
+        # The backbuffer used when scrolling, and the anchor it was drawn at.
+        # With a background color the backbuffer is opaque, which is much
+        # cheaper to blit on the screen than one with per pixel alpha.
+        self.background_color: Tuple[int, int, int] = background_color
+        self.backbuffer: Surface = None
+        self.backbuffer_x: int = 0
+        self.backbuffer_y: int = 0
+
+        # Layers drawn inside the backbuffer below this one, and the layer
+        # whose backbuffer has this one inside it
+        self.underlays: List['MapLayer'] = []
+        self.composited_into: 'MapLayer' = None
 
         # Parse the tiles
         self.tiles = self.__parse_tiles(filename)
+        self.columns: int = self.__count_columns()
 
         # Parse colliders if needed
         if is_collidable:
-            self.colliders = self.__parse_colliders(self.tiles)
+            self.collider_cells = self.__parse_colliders(self.tiles)
+            self.colliders = list(self.collider_cells.values())
+            self.collider_indices = {cell: index for index, cell in enumerate(self.collider_cells)}
     
     def __parse_tiles(self, filename: str):
         """
@@ -46,84 +72,374 @@ class MapLayer:
             tiles = list(csv.reader(file))
         return tiles
 
+    def __count_columns(self):
+        """
+        Returns the width (in tiles) of the widest row.
+        """
+        return max((len(row) for row in self.tiles), default=0)
+
+    def get_width(self):
+        """
+        Returns the width of the layer in pixels.
+        """
+        return self.columns * self.tileset.tilesize
+
+    def get_height(self):
+        """
+        Returns the height of the layer in pixels.
+        """
+        return len(self.tiles) * self.tileset.tilesize
+
     def __parse_colliders(self, tiles):
         """
-        Load the colliders in a CSV file.
+        Load the colliders in a CSV file. They are returned in a dictionary
+        indexed by their (row, column) cell so that they can be updated later.
         """
-        colliders = []
+        colliders = {}
         # Iterate over rows and columns 
-        for row_pos, row in enumerate(self.tiles):
+        for row_pos, row in enumerate(tiles):
             for column_pos, column in enumerate(row):
                 # Check if empty, if so ignore it
                 if not column:
                     continue
 
-                # Create the bounding box
-                bbox = BoundingBox(TILESIZE, TILESIZE)
-                bbox.pos_x = column_pos * TILESIZE
-                bbox.pos_y = row_pos * TILESIZE
-
-                # Add to the list
-                colliders.append(bbox)
+                # Add to the dictionary
+                colliders[(row_pos, column_pos)] = self.__create_collider(row_pos, column_pos)
 
         return colliders
 
+    def __create_collider(self, row_pos:int, column_pos:int):
+        """
+        Will create the bounding box of a single cell.
+        """
+        bbox = BoundingBox(TILESIZE, TILESIZE)
+        bbox.pos_x = column_pos * TILESIZE
+        bbox.pos_y = row_pos * TILESIZE
+        return bbox
+
+    def get_tile_value(self, row_pos:int, column_pos:int):
+        """
+        Returns the value of a cell, or an empty string if it is out of the map.
+        """
+        if row_pos < 0 or row_pos >= len(self.tiles):
+            return ''
+        row = self.tiles[row_pos]
+        if column_pos < 0 or column_pos >= len(row):
+            return ''
+        return row[column_pos]
+
+    def set_tile(self, row_pos:int, column_pos:int, value:str):
+        """
+        Will change a single cell of the map while the game is running (for
+        example, a block being destroyed). Only the collider and the part of
+        the render cache of that cell are updated.
+        """
+        # Grow the map if needed
+        while len(self.tiles) <= row_pos:
+            self.tiles.append([])
+        row = self.tiles[row_pos]
+        while len(row) <= column_pos:
+            row.append('')
+
+        row[column_pos] = value
+        self.columns = max(self.columns, len(row))
+        self.__update_cell(row_pos, column_pos)
+
+    def reload(self):
+        """
+        Will parse the file again and update only the cells that changed.
+        Returns the list of (row, column) cells that were updated. If a cell
+        is not a valid tile, InvalidTileError is raised and nothing changes.
+        """
+        old_tiles = self.tiles
+        new_tiles = self.__parse_tiles(self.filename)
+        self.__check_tiles(new_tiles)
+
+        # Find the cells that are different
+        changed = []
+        for row_pos in range(max(len(old_tiles), len(new_tiles))):
+            old_row = old_tiles[row_pos] if row_pos < len(old_tiles) else []
+            new_row = new_tiles[row_pos] if row_pos < len(new_tiles) else []
+
+            # Most of the rows should be the same
+            if old_row == new_row:
+                continue
+
+            for column_pos in range(max(len(old_row), len(new_row))):
+                old_value = old_row[column_pos] if column_pos < len(old_row) else ''
+                new_value = new_row[column_pos] if column_pos < len(new_row) else ''
+                if old_value != new_value:
+                    changed.append((row_pos, column_pos))
+
+        # Swap the tiles and update what changed
+        self.tiles = new_tiles
+        self.columns = self.__count_columns()
+        for row_pos, column_pos in changed:
+            self.__update_cell(row_pos, column_pos)
+
+        return changed
+
+    def __check_tiles(self, tiles):
+        """
+        Will raise InvalidTileError if a cell is not empty nor the index of a
+        tile of the tileset.
+        """
+        tile_count = len(self.tileset.sprites)
+        for row_pos, row in enumerate(tiles):
+            for column_pos, column in enumerate(row):
+                # Check if empty, if so ignore it
+                if not column:
+                    continue
+
+                try:
+                    index = int(column)
+                except ValueError:
+                    index = -1
+
+                if index < 0 or index >= tile_count:
+                    raise InvalidTileError("%s: cell (%d, %d) is not a tile of the tileset: %r" % (self.filename, row_pos, column_pos, column))
+
+    def __update_cell(self, row_pos:int, column_pos:int):
+        """
+        Will rebuild the collider and the render cache of a cell after its
+        value has changed.
+        """
+        # Update the collider
+        if self.is_collidable:
+            cell = (row_pos, column_pos)
+            if self.collider_cells.pop(cell, None) is not None:
+                # Move the last collider into the place of the removed one, so
+                # nothing has to be shifted in the list
+                index = self.collider_indices.pop(cell)
+                last = self.colliders.pop()
+                if index < len(self.colliders):
+                    self.colliders[index] = last
+                    self.collider_indices[(last.pos_y // TILESIZE, last.pos_x // TILESIZE)] = index
+
+            if self.get_tile_value(row_pos, column_pos):
+                bbox = self.__create_collider(row_pos, column_pos)
+                self.collider_cells[cell] = bbox
+                self.collider_indices[cell] = len(self.colliders)
+                self.colliders.append(bbox)
+
+        # Redraw the cell in the backbuffer that has it, if it is visible
+        owner = self.composited_into or self
+        if owner.backbuffer is not None:
+            tilesize = self.tileset.tilesize
+            area = pygame.Rect(column_pos * tilesize - owner.backbuffer_x, row_pos * tilesize - owner.backbuffer_y, tilesize, tilesize)
+            area = area.clip(owner.backbuffer.get_rect())
+            if area.width and area.height:
+                owner.__redraw_area(owner.backbuffer_x, owner.backbuffer_y, area)
+
+    def add_underlay(self, layer:'MapLayer'):
+        """
+        Will draw another layer inside the backbuffer of this one, below its
+        own tiles, so both are put on the screen with a single blit. The other
+        layer will not render by itself anymore. Both must have the same
+        parallax, as they scroll together.
+        """
+        if layer.parallax != self.parallax:
+            raise ValueError("an underlay must have the same parallax as the layer it is drawn into")
+
+        self.underlays.append(layer)
+        layer.composited_into = self
+        self.backbuffer = None
+
     def render(self, anchor_x:int, anchor_y:int, screen_size:Tuple[int], surface:Surface):
         """
         Will render the map on the surface provided.
         """
-        # Define the render frame for the X axis
-        start_x = math.floor(anchor_x / TILESIZE)
-        end_x = start_x + math.ceil(SCREEN_SIZE[0] / TILESIZE) + 1
+        # Already drawn as part of another layer
+        if self.composited_into is not None:
+            return
 
-        # Define the render frame for the Y axis
-        end_y = len(self.tiles) - math.floor(anchor_y / TILESIZE)
-        start_y = end_y - math.floor(SCREEN_SIZE[1] / TILESIZE)
-        start_y = 0 if start_y < 0 else start_y
+        # Reuse the last frame if in scrolling mode
+        if self.scrolling:
+            self.render_scrolling(anchor_x, anchor_y, screen_size, surface)
+            return
+
+        self.__blit_tiles(surface, anchor_x, anchor_y, (0, 0, screen_size[0], screen_size[1]))
+
+    def __blit_tiles(self, surface:Surface, anchor_x:int, anchor_y:int, area:Tuple[int, int, int, int]):
+        """
+        Will blit the tiles touching an area of the screen on the surface.
+        """
+        tilesize = self.tileset.tilesize
+
+        # Define the render frame for both axis
+        start_x, end_x, start_y, end_y = get_visible_tiles(anchor_x, anchor_y, area, tilesize, len(self.tiles), self.columns)
 
         # Define the anchor offset for the tiles
-        anchor_x = - int(anchor_x % TILESIZE)
+        anchor_x = math.floor(anchor_x)
+        anchor_y = math.floor(anchor_y)
 
         # Iterate over rows and columns 
-        for row_pos, row in enumerate(self.tiles[start_y:end_y]):
-            for column_pos, column in enumerate(row[start_x:end_x]):
+        for row_pos in range(start_y, end_y):
+            row = self.tiles[row_pos]
+            for column_pos in range(start_x, min(end_x, len(row))):
+                column = row[column_pos]
 
                 # Check if empty, if so ignore it
                 if not column:
                     continue
 
                 # Get the positions based on tilesize
-                pos_x = anchor_x + (column_pos * self.tileset.tilesize)
-                pos_y = anchor_y + (row_pos * self.tileset.tilesize)
+                pos_x = column_pos * tilesize - anchor_x
+                pos_y = row_pos * tilesize - anchor_y
                 # Blit on the screen
                 surface.blit(self.tileset.get_tile(int(column)), (pos_x, pos_y))
 
-                
+    def render_scrolling(self, anchor_x:int, anchor_y:int, screen_size:Tuple[int], surface:Surface):
+        """
+        Will render the map on the surface provided using a backbuffer. The
+        previous frame is scrolled by the amount the anchor moved and only the
+        tiles in the newly exposed strips are drawn, so the cost depends on the
+        scroll speed instead of the screen area.
+        """
+        # Only whole pixels matter, as the tiles are drawn at integer positions
+        anchor_x = math.floor(anchor_x)
+        anchor_y = math.floor(anchor_y)
+        width, height = screen_size
+
+        # Redraw everything if there is no usable previous frame
+        if self.backbuffer is None or self.backbuffer.get_size() != (width, height):
+            self.backbuffer = self.__create_backbuffer(width, height)
+            self.__redraw_area(anchor_x, anchor_y, pygame.Rect(0, 0, width, height))
+
+        else:
+            delta_x = anchor_x - self.backbuffer_x
+            delta_y = anchor_y - self.backbuffer_y
+
+            if abs(delta_x) >= width or abs(delta_y) >= height:
+                self.__redraw_area(anchor_x, anchor_y, pygame.Rect(0, 0, width, height))
+
+            elif delta_x or delta_y:
+                # Move the previous frame and draw the exposed columns and rows
+                self.backbuffer.scroll(-delta_x, -delta_y)
+
+                if delta_x > 0:
+                    self.__redraw_area(anchor_x, anchor_y, pygame.Rect(width - delta_x, 0, delta_x, height))
+                elif delta_x < 0:
+                    self.__redraw_area(anchor_x, anchor_y, pygame.Rect(0, 0, -delta_x, height))
+
+                if delta_y > 0:
+                    self.__redraw_area(anchor_x, anchor_y, pygame.Rect(0, height - delta_y, width, delta_y))
+                elif delta_y < 0:
+                    self.__redraw_area(anchor_x, anchor_y, pygame.Rect(0, 0, width, -delta_y))
+
+        # Remember where the backbuffer is
+        self.backbuffer_x = anchor_x
+        self.backbuffer_y = anchor_y
+
+        surface.blit(self.backbuffer, (0, 0))
+
+    def __create_backbuffer(self, width:int, height:int):
+        """
+        Will create the backbuffer, opaque if there is a background color.
+        """
+        if self.background_color is not None:
+            backbuffer = pygame.Surface((width, height))
+        else:
+            backbuffer = pygame.Surface((width, height), pygame.SRCALPHA)
+
+        # Use the same pixel format as the screen, if there is one
+        if pygame.display.get_surface() is not None:
+            backbuffer = backbuffer.convert() if self.background_color is not None else backbuffer.convert_alpha()
+
+        return backbuffer
+
+    def __redraw_area(self, anchor_x:int, anchor_y:int, area:pygame.Rect):
+        """
+        Will clear and draw the tiles of an area of the backbuffer, including
+        the underlays. The area is given in screen coordinates.
+        """
+        backbuffer = self.backbuffer
+
+        # Clip so that tiles crossing the border don't draw over the rest of
+        # the previous frame
+        backbuffer.set_clip(area)
+        backbuffer.fill(self.background_color or (0, 0, 0, 0), area)
+
+        for layer in self.underlays + [self]:
+            layer.__blit_tiles(backbuffer, anchor_x, anchor_y, area)
+
+        backbuffer.set_clip(None)
 
 class Map:
     """
     Will store the full information of a map.
     """
-    def __init__(self):
+    def __init__(self, scrolling:bool = False, background_color:Tuple[int, int, int] = (0, 0, 0)):
+        # If set, everything below the player is drawn in a single opaque
+        # scrolling backbuffer filled with the background color
+        self.scrolling: bool = scrolling
+        self.background_color: Tuple[int, int, int] = background_color
+
         # Initialize layers
         self.foreground: MapLayer = None
         self.background: MapLayer = None
         self.colliders: MapLayer = None
 
-    def load_background(self, filename:str, tileset:Tileset):
+    def get_layers(self):
+        """
+        Returns the layers that have been loaded, from back to front.
+        """
+        return [layer for layer in (self.background, self.colliders, self.foreground) if layer is not None]
+
+    def load_background(self, filename:str, tileset:Tileset, parallax:float = 1.0):
         """
-        Will load a background tileset from a CSV file.
+        Will load a background tileset from a CSV file. Use a parallax lower
+        than 1 to make it scroll slower than the rest of the level.
         """
-        self.background = MapLayer(filename, tileset)
+        self.background = MapLayer(filename, tileset, parallax=parallax)
+        self.__setup_scrolling()
 
-    def load_foreground(self, filename:str, tileset:Tileset):
+    def load_foreground(self, filename:str, tileset:Tileset, parallax:float = 1.0):
         """
         Will load a foreground tileset from a CSV file.
         """
-        self.foreground = MapLayer(filename, tileset)
+        self.foreground = MapLayer(filename, tileset, parallax=parallax)
 
     def load_colliders(self, filename:str, tileset:Tileset):
         """
         Will load the collision layer from a CSV file.
         """
-        self.colliders = MapLayer(filename, tileset, True)
\ No newline at end of file
+        self.colliders = MapLayer(filename, tileset, True)
+        self.__setup_scrolling()
+
+    def __setup_scrolling(self):
+        """
+        Will choose which layer owns the scrolling backbuffer. The collision
+        layer draws the background inside it when both scroll together,
+        otherwise only the background scrolls. The foreground is always drawn
+        directly, as an extra backbuffer with alpha on top of the player costs
+        more to blit than its few tiles.
+        """
+        for layer in self.get_layers():
+            layer.scrolling = False
+            layer.background_color = None
+            layer.backbuffer = None
+            layer.underlays = []
+            layer.composited_into = None
+
+        if not self.scrolling:
+            return
+
+        # Pick the layer that goes to the screen first
+        owner = self.colliders
+        if owner is None or (self.background is not None and self.background.parallax != owner.parallax):
+            owner = self.background
+        if owner is None:
+            return
+
+        owner.scrolling = True
+        owner.background_color = self.background_color
+        if owner is not self.background and self.background is not None:
+            owner.add_underlay(self.background)
+
+    def is_opaque(self):
+        """
+        Returns True if the map covers the whole screen when rendered, so there
+        is no need to clear it first.
+        """
+        return any(layer.scrolling and layer.background_color is not None for layer in self.get_layers())
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+This module has the code used to account for the memory used by the loaded
+assets. It walks the tilesets, map layers and players and reports, for each
+one of them, how many bytes are used by surface pixels (width x height x bytes
+per pixel) and by the Python objects that hold them (lists, dictionaries,
+strings, bounding boxes...).
+
+Objects are only counted once per report, so the surfaces of a tileset are not
+counted again in the layers that use it.
+"""
+
+import os
+import sys
+import warnings
+
+from typing import List
+
+import pygame
+
+
+class MemoryBudgetWarning(RuntimeWarning):
+    """
+    Issued when the assets use more memory than the configured budget.
+    """
+
+
+def surface_bytes(surface:pygame.Surface):
+    """
+    Returns how many bytes the pixels of a surface use.
+    """
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def measure(obj, seen:set = None):
+    """
+    Will walk an object and everything it references, returning a tuple with
+    the bytes used by surfaces and by Python objects. Objects whose id is in
+    seen are skipped, and every object visited is added to it.
+    """
+    if seen is None:
+        seen = set()
+
+    surfaces = 0
+    objects = 0
+
+    # Walk without recursion, as the tile lists can be very long
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+
+        # Skip what was already counted
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+
+        objects += sys.getsizeof(current)
+
+        if isinstance(current, pygame.Surface):
+            surfaces += surface_bytes(current)
+
+        elif isinstance(current, (str, bytes, int, float, bool, type(None))):
+            continue
+
+        elif isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+
+        else:
+            # Plain objects keep their attributes in __dict__ or __slots__
+            if hasattr(current, "__dict__"):
+                pending.append(current.__dict__)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    pending.append(getattr(current, slot))
+
+    return surfaces, objects
+
+
+class MemoryEntry:
+    """
+    The memory used by a single asset.
+    """
+
+    def __init__(self, category:str, name:str, surfaces:int, objects:int):
+        self.category: str = category
+        self.name: str = name
+        self.surfaces: int = surfaces
+        self.objects: int = objects
+
+    @property
+    def total(self):
+        return self.surfaces + self.objects
+
+    def to_dict(self):
+        return {
+            "category": self.category,
+            "name": self.name,
+            "surfaces": self.surfaces,
+            "objects": self.objects,
+            "total": self.total,
+        }
+
+
+class MemoryReport:
+    """
+    Stores the memory used by each asset added to it. If a budget (in bytes) is
+    set, check() will issue a MemoryBudgetWarning when the total exceeds it.
+    """
+
+    def __init__(self, budget:int = None):
+        self.budget: int = budget
+        self.entries: List[MemoryEntry] = []
+
+        # Ids of everything counted so far
+        self.seen = set()
+
+    def add(self, category:str, name:str, obj):
+        """
+        Will measure an object and add it to the report.
+        """
+        surfaces, objects = measure(obj, self.seen)
+        entry = MemoryEntry(category, name, surfaces, objects)
+        self.entries.append(entry)
+        return entry
+
+    def add_tileset(self, name:str, tileset):
+        return self.add("tileset", name, tileset)
+
+    def add_map(self, name:str, map):
+        """
+        Will add each one of the layers of a map, named after their files. The
+        tilesets should be added before, otherwise they are counted as part of
+        the first layer using them.
+        """
+        layers = map.get_layers()
+        for layer in layers:
+            # Composited layers reference each other, so hide the other layers
+            # while measuring this one to keep them in their own entries
+            others = {id(other) for other in layers if other is not layer} - self.seen
+            self.seen |= others
+
+            layer_name = os.path.splitext(os.path.basename(layer.filename))[0]
+            self.add("layer", "%s.%s" % (name, layer_name), layer)
+
+            self.seen -= others
+
+    def add_player(self, name:str, player):
+        return self.add("player", name, player)
+
+    @property
+    def surfaces(self):
+        return sum(entry.surfaces for entry in self.entries)
+
+    @property
+    def objects(self):
+        return sum(entry.objects for entry in self.entries)
+
+    @property
+    def total(self):
+        return self.surfaces + self.objects
+
+    def is_over_budget(self):
+        return self.budget is not None and self.total > self.budget
+
+    def check(self):
+        """
+        Will warn if the budget has been exceeded. Returns True if it has.
+        """
+        if self.is_over_budget():
+            warnings.warn("assets use %d bytes, over the budget of %d bytes" % (self.total, self.budget), MemoryBudgetWarning)
+            return True
+        return False
+
+    def to_dict(self):
+        return {
+            "budget": self.budget,
+            "surfaces": self.surfaces,
+            "objects": self.objects,
+            "total": self.total,
+            "entries": [entry.to_dict() for entry in self.entries],
+        }
+
+    def __str__(self):
+        lines = ["%-10s %-24s %12s %12s %12s" % ("category", "name", "surfaces", "objects", "total")]
+        for entry in self.entries:
+            lines.append("%-10s %-24s %12d %12d %12d" % (entry.category, entry.name, entry.surfaces, entry.objects, entry.total))
+        lines.append("%-10s %-24s %12d %12d %12d" % ("", "total", self.surfaces, self.objects, self.total))
+        if self.budget is not None:
+            lines.append("budget: %d bytes (%s)" % (self.budget, "exceeded" if self.is_over_budget() else "ok"))
+        return "\n".join(lines)
@@ -0,0 +1,107 @@
+"""
+This module has the pipelined game loop. The simulation runs in its own thread
+and writes each tick into one of two state buffers while the main thread draws
+the other one, which holds the previous tick. Both threads meet at the end of
+each tick, when the buffers are swapped. As pygame releases the GIL while
+blitting big surfaces, the simulation can keep running while SDL draws.
+
+The buffers use the snapshot format from the snapshots module, so the render
+side only needs to unpack them.
+"""
+
+import threading
+
+from typing import Callable
+
+from snapshots import SNAPSHOT_SIZE
+
+
+class Pipeline:
+    """
+    Runs a simulation function in a background thread, one tick ahead of the
+    render function. The simulate function receives the buffer it has to fill
+    and the render function receives the buffer it has to draw. The on_swap
+    function is called at every tick boundary while both threads are waiting,
+    so it can safely change anything shared by them (like the input state or
+    the map).
+    """
+
+    def __init__(self, simulate:Callable, render:Callable, on_swap:Callable = None):
+        # Store the callbacks
+        self.simulate: Callable = simulate
+        self.render: Callable = render
+        self.on_swap: Callable = on_swap
+
+        # The two state buffers and which one is being drawn. Only the barrier
+        # action changes the index, and it runs while both threads are waiting,
+        # so the buffers themselves don't need a lock.
+        self.buffers = [bytearray(SNAPSHOT_SIZE), bytearray(SNAPSHOT_SIZE)]
+        self.front: int = 0
+
+        self.running: bool = False
+        self.thread: threading.Thread = None
+
+        # The exception that stopped the simulation thread, if any
+        self.error: BaseException = None
+        self.barrier = threading.Barrier(2, action=self.__swap)
+
+    def __swap(self):
+        """
+        Called by the barrier once both threads have finished their tick.
+        """
+        self.front = 1 - self.front
+        if self.on_swap is not None:
+            self.on_swap()
+
+    def __run(self):
+        """
+        The simulation thread loop. If it fails, the error is kept so that the
+        main thread can raise it, and the barrier is broken so that the main
+        thread does not wait forever.
+        """
+        try:
+            while self.running:
+                self.simulate(self.buffers[1 - self.front])
+                self.barrier.wait()
+        except threading.BrokenBarrierError:
+            # Stopped, or the main thread failed
+            pass
+        except BaseException as error:
+            self.error = error
+        finally:
+            self.barrier.abort()
+
+    def start(self):
+        """
+        Will simulate the first tick and start the simulation thread.
+        """
+        # Fill the front buffer so there is something to draw
+        self.simulate(self.buffers[self.front])
+
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def frame(self):
+        """
+        Will draw the previous tick and wait for the simulation to finish the
+        current one. Must be called from the main thread. Raises the error of
+        the simulation thread if it has failed.
+        """
+        self.render(self.buffers[self.front])
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            if self.error is not None:
+                raise self.error
+            raise
+
+    def stop(self):
+        """
+        Will stop the simulation thread.
+        """
+        self.running = False
+        self.barrier.abort()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -6,6 +6,7 @@ class and the constants used to control the player state.
 import pygame
 
 from maps import Map
+from camera import Camera
 from collisions import *
 
 import constants
@@ -48,7 +49,10 @@ class Player:
 
     def __init__(self, filename: str):
 
-        self.col = []
+        # The contacts found in the last update. The manifold is reused every
+        # frame to avoid allocating new lists. The col alias is left for debug.
+        self.contacts = ContactManifold()
+        self.col = self.contacts
 
         # The player frames are stored in dictionaries. To make things simpler,
         # we have a dictionary for each direction as the player can face left
@@ -196,13 +200,14 @@ class Player:
     def gravity(self):
         self.pos_y += self.gravity_speed + self.current_jump
 
-    def snap(self, collision, offset):
+    def snap(self, collision, offset, anchor_x = 0, anchor_y = 0):
 
-        # Get the dimensions of the player
-        top = self.pos_y
-        bottom = self.pos_y + constants.PLAYER_SIZE
-        left = self.pos_x
-        right = self.pos_x + constants.PLAYER_SIZE
+        # Get the dimensions of the player in the level, as the tiles are
+        # aligned to the level and not to the screen
+        top = self.pos_y + anchor_y
+        bottom = top + constants.PLAYER_SIZE
+        left = self.pos_x + anchor_x
+        right = left + constants.PLAYER_SIZE
 
         if collision == COLLISION_BOTTOM:
             self.pos_y -= bottom % constants.TILESIZE
@@ -216,51 +221,7 @@ class Player:
         if collision == COLLISION_RIGHT:
             self.pos_x -= right % constants.TILESIZE
 
-    def collision_left(self, colliders, anchor_x, anchor_y):
-
-        # Reset collisions
-        collisions = []
-
-        # Check if colliding with the map
-        for collider in colliders:
-            collisions += self.boundaries.get_left_collision(self.pos_x + anchor_x, self.pos_y + anchor_y, collider, collider.pos_x, collider.pos_y)
-            
-        return collisions
-
-    def collision_right(self, colliders, anchor_x, anchor_y):
-
-        # Reset collisions
-        collisions = []
-
-        # Check if colliding with the map
-        for collider in colliders:
-            collisions += self.boundaries.get_right_collision(self.pos_x + anchor_x, self.pos_y + anchor_y, collider, collider.pos_x, collider.pos_y)
-            
-        return collisions
-
-    def collision_bottom(self, colliders, anchor_x, anchor_y):
-
-        # Reset collisions
-        collisions = []
-
-        # Check if colliding with the map
-        for collider in colliders:
-            collisions += self.boundaries.get_bottom_collision(self.pos_x + anchor_x, self.pos_y + anchor_y, collider, collider.pos_x, collider.pos_y)
-            
-        return collisions
-
-    def collision_top(self, colliders, anchor_x, anchor_y):
-
-        # Reset collisions
-        collisions = []
-
-        # Check if colliding with the map
-        for collider in colliders:
-            collisions += self.boundaries.get_top_collision(self.pos_x + anchor_x, self.pos_y + anchor_y, collider, collider.pos_x, collider.pos_y)
-            
-        return collisions
-        
-    def walk(self, anchor_x, anchor_y, max_anchor_x, left = False, right = False):
+    def walk(self, camera:Camera, left = False, right = False):
         if self.current_state != PlayerState.JUMPING:
             # Set the state to walking
             self.current_state = PlayerState.WALKING
@@ -271,30 +232,44 @@ class Player:
                 self.current_frame = self.current_frame + 1 if self.current_frame < len(self.sprites_left[PlayerState.WALKING]) - 1 else 0 
                 self.ticks = 0
         
+        # The player stays in the middle of the screen while the camera can
+        # scroll
+        middle = camera.screen_size[0]/2
+
         # Update the position
         if left:
-            if self.pos_x <= constants.SCREEN_SIZE[0]/2 and anchor_x==0:
+            if self.pos_x <= middle and camera.x==0:
                 self.pos_x -= self.player_speed
 
-            elif self.pos_x >= constants.SCREEN_SIZE[0]/2 and anchor_x>=max_anchor_x:
+            elif self.pos_x >= middle and camera.x>=camera.max_x:
                 self.pos_x -= self.player_speed
 
             else:
-                anchor_x -= self.player_speed
-                if anchor_x < 0:
-                    self.pos_x += anchor_x
-                    anchor_x = 0
+                camera.x -= self.player_speed
+                if camera.x < 0:
+                    self.pos_x += camera.x
+                    camera.x = 0
         if right:
-            if self.pos_x >= constants.SCREEN_SIZE[0]/2 and anchor_x<max_anchor_x:
-                anchor_x += self.player_speed
-                if anchor_x > max_anchor_x:
-                    self.pos_x += anchor_x - max_anchor_x
-                    anchor_x = max_anchor_x
+            if self.pos_x >= middle and camera.x<camera.max_x:
+                camera.x += self.player_speed
+                if camera.x > camera.max_x:
+                    self.pos_x += camera.x - camera.max_x
+                    camera.x = camera.max_x
             else:
                 self.pos_x += self.player_speed
 
-        return anchor_x, anchor_y
 
+    def follow(self, camera:Camera):
+        """
+        Will scroll the camera vertically to keep the player in the middle of
+        the screen, as far as the level allows. The player position is relative
+        to the screen, so it moves the other way.
+        """
+        middle = camera.screen_size[1]/2
+
+        camera_y = min(max(camera.y + self.pos_y - middle, 0), camera.max_y)
+        self.pos_y -= camera_y - camera.y
+        camera.y = camera_y
 
     def stand(self):
         if self.current_state != PlayerState.JUMPING:
@@ -324,67 +299,58 @@ class Player:
         # By default, player is in air
         self.ground_state = PlayerState.AIR
 
-        parsed_collisions = []
-        col = self.collision_bottom(map.colliders.colliders, anchor_x, anchor_y)
+        # Gather the contacts of all sides in a single pass
+        self.collide(map.colliders.colliders, anchor_x, anchor_y)
 
-        # Left here for debug
-        self.col = col
+        # Resolve the contacts, one side at a time
+        self.resolve(COLLISION_BOTTOM, anchor_x, anchor_y)
+        self.resolve(COLLISION_TOP, anchor_x, anchor_y)
+        self.resolve(COLLISION_RIGHT, anchor_x, anchor_y)
+        self.resolve(COLLISION_LEFT, anchor_x, anchor_y)
 
-        # Check collisions with map and snap positions
-        for collision_type, offset, junk in col:
+    def collide(self, colliders, anchor_x, anchor_y):
+        """
+        Will fill the contact manifold with every contact between the player
+        and the colliders provided.
+        """
+        contacts = self.contacts
+        contacts.clear()
 
-            # If touching the ground, set as GROUNDED
-            if collision_type == COLLISION_BOTTOM:
-                self.ground_state = PlayerState.GROUNDED
-                
-                if self.current_state == PlayerState.JUMPING:
-                    self.reset_frame()
-                    self.current_jump = 0
-                    self.current_state = PlayerState.STANDING
+        # Those don't change inside the loop
+        boundaries = self.boundaries
+        pos_x = self.pos_x + anchor_x
+        pos_y = self.pos_y + anchor_y
 
-            if collision_type not in parsed_collisions:
-                self.snap(collision_type, offset)
-                parsed_collisions.append(collision_type)
+        # Check if colliding with the map
+        for collider in colliders:
+            boundaries.get_contacts(pos_x, pos_y, collider, collider.pos_x, collider.pos_y, contacts)
 
-        parsed_collisions = []
-        col = self.collision_top(map.colliders.colliders, anchor_x, anchor_y)
+    def resolve(self, collision_type, anchor_x, anchor_y):
+        """
+        Will handle the contacts of a given side and snap the player position.
+        Each side is snapped only once.
+        """
+        contacts = self.contacts.contacts
+        for i in range(self.contacts.count):
+            contact = contacts[i]
+            if contact.collision_type != collision_type:
+                continue
 
-        # Left here for debug
-        self.col += col
+            # Snapping another side may have moved the player away from this
+            # collider, so check it again
+            if not self.boundaries.touches(self.pos_x + anchor_x, self.pos_y + anchor_y, contact):
+                continue
 
-        # Check collisions with map and snap positions
-        for collision_type, offset, junk in col:
-            
-            if collision_type == COLLISION_TOP:           
+            # If touching the ground, set as GROUNDED
+            if collision_type == COLLISION_BOTTOM:
+                self.ground_state = PlayerState.GROUNDED
+
+            # Landing or hitting the ceiling finishes the jump
+            if collision_type in (COLLISION_BOTTOM, COLLISION_TOP):
                 if self.current_state == PlayerState.JUMPING:
                     self.reset_frame()
                     self.current_jump = 0
                     self.current_state = PlayerState.STANDING
 
-            if collision_type not in parsed_collisions:
-                self.snap(collision_type, offset)
-                parsed_collisions.append(collision_type)
-
-        parsed_collisions = []
-        col = self.collision_right(map.colliders.colliders, anchor_x, anchor_y)
-
-        # Left here for debug
-        self.col += col
-
-        # Check collisions with map and snap positions
-        for collision_type, offset, junk in col:
-
-            if collision_type not in parsed_collisions:
-                self.snap(collision_type, offset)
-                parsed_collisions.append(collision_type)
-
-        parsed_collisions = []
-        col = self.collision_left(map.colliders.colliders, anchor_x, anchor_y)
-        self.col += col
-
-        # Check collisions with map and snap positions
-        for collision_type, offset, junk in col:
-
-            if collision_type not in parsed_collisions:
-                self.snap(collision_type, offset)
-                parsed_collisions.append(collision_type)
+            self.snap(collision_type, contact.offset, anchor_x, anchor_y)
+            return
@@ -0,0 +1,169 @@
+"""
+This module has the code used to take snapshots of the game simulation. A
+snapshot is the player state plus the camera anchor packed in a fixed size
+binary struct, which is cheap enough to be taken every single tick. The
+snapshots are kept in a ring buffer that can be used to rewind the game or to
+quickly restore a previous state.
+
+The game loop is not paced, so the buffer has timed versions of push and rewind
+that only act once per tick of the tick rate. That way the buffer holds the
+last seconds of the game no matter how fast the loop runs.
+"""
+
+import struct
+
+from player import Player, PlayerState
+
+# The states are stored as strings in the player, so we store their index in
+# those tuples instead.
+ACTION_STATES = (PlayerState.STANDING, PlayerState.WALKING, PlayerState.JUMPING, PlayerState.CROUCHING)
+GROUND_STATES = (PlayerState.GROUNDED, PlayerState.AIR)
+DIRECTION_STATES = (PlayerState.LEFT, PlayerState.RIGHT)
+
+# Player position (x, y), current jump velocity, camera anchor (x, y), current
+# frame, ticks and the three state indices.
+SNAPSHOT_FORMAT = struct.Struct("<5d2I3B")
+SNAPSHOT_SIZE = SNAPSHOT_FORMAT.size
+
+# Used to map the states back to their indices without searching the tuples
+_ACTION_INDEX = {state: index for index, state in enumerate(ACTION_STATES)}
+_GROUND_INDEX = {state: index for index, state in enumerate(GROUND_STATES)}
+_DIRECTION_INDEX = {state: index for index, state in enumerate(DIRECTION_STATES)}
+
+
+def pack_snapshot(buffer, offset:int, player:Player, anchor_x, anchor_y):
+    """
+    Will write a snapshot of the player and the anchor into the buffer provided
+    at the given offset.
+    """
+    SNAPSHOT_FORMAT.pack_into(
+        buffer, offset,
+        player.pos_x, player.pos_y, player.current_jump, anchor_x, anchor_y,
+        player.current_frame, player.ticks,
+        _ACTION_INDEX[player.current_state],
+        _GROUND_INDEX[player.ground_state],
+        _DIRECTION_INDEX[player.direction])
+
+
+def unpack_snapshot(buffer, offset:int, player:Player):
+    """
+    Will restore the player from the snapshot stored in the buffer at the
+    given offset. Returns the anchor as a (anchor_x, anchor_y) tuple.
+    """
+    (player.pos_x, player.pos_y, player.current_jump, anchor_x, anchor_y,
+     player.current_frame, player.ticks,
+     current_state, ground_state, direction) = SNAPSHOT_FORMAT.unpack_from(buffer, offset)
+
+    player.current_state = ACTION_STATES[current_state]
+    player.ground_state = GROUND_STATES[ground_state]
+    player.direction = DIRECTION_STATES[direction]
+
+    return anchor_x, anchor_y
+
+
+class SnapshotBuffer:
+    """
+    A ring buffer that stores the last snapshots of the game. All the memory is
+    allocated upfront, so pushing a new snapshot only packs the values in
+    place. When the buffer is full, the oldest snapshot is overwritten.
+    """
+
+    def __init__(self, seconds:float, tick_rate:int = 60):
+        # Store the capacity in ticks
+        self.capacity: int = max(int(seconds * tick_rate), 1)
+
+        # Time between ticks (in milliseconds) and when the last timed push or
+        # rewind happened
+        self.interval: float = 1000 / tick_rate
+        self.last_time: float = None
+
+        # Preallocate the whole buffer
+        self.buffer = bytearray(self.capacity * SNAPSHOT_SIZE)
+
+        # Position where the next snapshot is written and how many are stored
+        self.head: int = 0
+        self.count: int = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.last_time = None
+
+    def push(self, player:Player, anchor_x, anchor_y):
+        """
+        Will store a new snapshot of the game.
+        """
+        pack_snapshot(self.buffer, self.head * SNAPSHOT_SIZE, player, anchor_x, anchor_y)
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def is_due(self, time_ms:float):
+        """
+        Returns True if a tick has passed since the last timed push or rewind.
+        """
+        return self.last_time is None or time_ms - self.last_time >= self.interval
+
+    def __advance(self, time_ms:float):
+        """
+        Will move the time of the last tick forward. It keeps to the tick rate
+        schedule so that it does not drift, unless the game fell behind.
+        """
+        if self.last_time is None or time_ms - self.last_time >= 2 * self.interval:
+            self.last_time = time_ms
+        else:
+            self.last_time += self.interval
+
+    def push_at(self, time_ms:float, player:Player, anchor_x, anchor_y):
+        """
+        Will store a new snapshot if a tick has passed since the last one.
+        The time is in milliseconds, like pygame.time.get_ticks(). Returns
+        True if the snapshot was stored.
+        """
+        if not self.is_due(time_ms):
+            return False
+
+        self.__advance(time_ms)
+        self.push(player, anchor_x, anchor_y)
+        return True
+
+    def rewind_at(self, time_ms:float, player:Player):
+        """
+        Will rewind one tick if a tick has passed since the last timed push or
+        rewind, so the game goes back in time at the same speed it was
+        recorded. Returns the anchor, or None if it is not time yet.
+        """
+        if not self.is_due(time_ms):
+            return None
+
+        self.__advance(time_ms)
+        return self.rewind(player)
+
+    def restore(self, player:Player, ticks_back:int = 0):
+        """
+        Will restore the snapshot taken ticks_back ticks before the last one,
+        without removing anything from the buffer. Returns the anchor.
+        """
+        if ticks_back < 0 or ticks_back >= self.count:
+            raise IndexError("there is no snapshot %d ticks back" % ticks_back)
+
+        index = (self.head - 1 - ticks_back) % self.capacity
+        return unpack_snapshot(self.buffer, index * SNAPSHOT_SIZE, player)
+
+    def rewind(self, player:Player, ticks:int = 1):
+        """
+        Will go back in time, dropping the last ticks snapshots and restoring
+        the one before them. The restored snapshot stays in the buffer so the
+        game can be rewinded again. Returns the anchor.
+        """
+        # Keep at least one snapshot to restore
+        ticks = min(ticks, self.count - 1)
+        if ticks < 0:
+            raise IndexError("there are no snapshots to rewind to")
+
+        self.head = (self.head - ticks) % self.capacity
+        self.count -= ticks
+        return self.restore(player)
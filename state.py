@@ -20,6 +20,19 @@ class InputController:
         self.down = False
         self.quit = False
         self.jump = False
+        self.rewind = False
+
+    def copy_from(self, other:'InputController'):
+        """
+        Will copy the state of another input controller.
+        """
+        self.left = other.left
+        self.up = other.up
+        self.right = other.right
+        self.down = other.down
+        self.quit = other.quit
+        self.jump = other.jump
+        self.rewind = other.rewind
 
     def update(self):
 
@@ -43,6 +56,9 @@ class InputController:
                 if event.key == pygame.K_DOWN:
                     self.down = True
 
+                if event.key == pygame.K_BACKSPACE:
+                    self.rewind = True
+
                 if event.type == pygame.KEYDOWN:
                     self.jump = True
 
@@ -59,5 +75,8 @@ class InputController:
                 if event.key == pygame.K_DOWN:
                     self.down = False
 
+                if event.key == pygame.K_BACKSPACE:
+                    self.rewind = False
+
             if event.type == pygame.KEYDOWN:
                 self.jump = event.key == pygame.K_SPACE
\ No newline at end of file
@@ -0,0 +1,422 @@
+"""
+This module has a command line tool that validates all the levels inside a
+folder (by default, ./assets/levels). Each level is a folder with the
+background, foreground and colliders CSV files. For each level it checks:
+
+- that all the rows of a layer have the same width and that the three layers
+  have the same shape;
+- that every tile index exists in the tileset;
+- which parts of the level the player can reach, starting from where the
+  player spawns and using the player jump and gravity physics.
+
+The levels are validated in parallel using a process pool, and the results are
+cached by the hash of the level files, so only the levels that changed are
+validated again:
+
+    python validate.py --levels ./assets/levels --cache .validate_cache.json
+"""
+
+import os
+
+# Make sure pygame does not try to open a real window or sound device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import csv
+import hashlib
+import json
+import sys
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import constants
+
+from tiles import Tileset
+from player import Player, PlayerState
+
+# The files every level must have
+LAYER_FILES = ("background", "foreground", "colliders")
+
+# Bump this when the checks change, so cached results are discarded
+VALIDATOR_VERSION = 1
+
+# Maximum number of unreachable cells listed for each level
+MAX_LISTED_CELLS = 20
+
+DEFAULT_LEVELS = "./assets/levels"
+DEFAULT_CACHE = "./.validate_cache.json"
+
+
+def jump_profile(player:Player, clearance:float):
+    """
+    Will simulate a jump using the player physics and return the trajectory as
+    a list of (distance, height) tuples, one for each frame, both in pixels.
+    The player walks forward during the whole jump. If the head hits something
+    at the clearance height the jump stops there and the player falls, just
+    like when snapping to a ceiling. The trajectory stops once the player is
+    falling at full speed, as from there on the fall is linear.
+    """
+    # Start a jump from the ground
+    player.pos_x = 0
+    player.pos_y = 0
+    player.current_state = PlayerState.JUMPING
+    player.current_jump = player.jump_speed
+
+    profile = [(0, 0)]
+    while True:
+        # Same order as in Player.update
+        if player.current_state == PlayerState.JUMPING:
+            player.jump()
+        player.gravity()
+        player.pos_x += player.player_speed
+
+        # Hit the ceiling
+        if -player.pos_y >= clearance:
+            player.pos_y = -clearance
+            player.current_jump = 0
+            player.current_state = PlayerState.STANDING
+
+        profile.append((player.pos_x, -player.pos_y))
+
+        # Falling at full speed
+        if player.current_jump == 0 and player.pos_y > 0:
+            break
+
+    return profile
+
+
+def load_physics(max_rise:int = 8):
+    """
+    Will create a player and compute its jump profiles for each ceiling
+    clearance from 0 to max_rise tiles. The last profile has no ceiling.
+    """
+    player = Player(constants.FILEPATH_CHARSET)
+    profiles = [jump_profile(player, clearance * constants.TILESIZE) for clearance in range(max_rise)]
+    profiles.append(jump_profile(player, float("inf")))
+
+    return {
+        "tilesize": constants.TILESIZE,
+        "player_speed": player.player_speed,
+        "gravity_speed": player.gravity_speed,
+        "profiles": profiles,
+    }
+
+
+def get_reach(profile:List[Tuple[float, float]], height:float, player_speed:float, gravity_speed:float):
+    """
+    Returns how far (in pixels) the player can move forward and still be at or
+    above the height provided while falling. Returns None if the height is
+    never reached.
+    """
+    # After the profile the player falls in a straight line
+    last_x, last_height = profile[-1]
+    if height <= last_height:
+        return last_x + (last_height - height) / gravity_speed * player_speed
+
+    reach = None
+    for x, profile_height in profile:
+        if profile_height >= height:
+            reach = x
+    return reach
+
+
+def read_layer(filename:str):
+    """
+    Will parse a layer CSV file, just like MapLayer does.
+    """
+    with open(filename, 'r') as file:
+        return list(csv.reader(file))
+
+
+def check_shapes(layers:Dict[str, List[List[str]]], errors:List[str]):
+    """
+    Will check that all rows of each layer have the same width and that all
+    layers have the same shape.
+    """
+    shapes = {}
+    for name, tiles in layers.items():
+        width = len(tiles[0]) if tiles else 0
+        for row_pos, row in enumerate(tiles):
+            if len(row) != width:
+                errors.append("%s: row %d has %d columns, expected %d" % (name, row_pos, len(row), width))
+        shapes[name] = (len(tiles), width)
+
+    if len(set(shapes.values())) > 1:
+        errors.append("layers have different shapes: %s" % ", ".join("%s is %dx%d" % (name, rows, columns) for name, (rows, columns) in shapes.items()))
+
+
+def check_tiles(layers:Dict[str, List[List[str]]], tile_count:int, errors:List[str]):
+    """
+    Will check that every tile index exists in the tileset.
+    """
+    for name, tiles in layers.items():
+        for row_pos, row in enumerate(tiles):
+            for column_pos, column in enumerate(row):
+                # Check if empty, if so ignore it
+                if not column:
+                    continue
+
+                try:
+                    index = int(column)
+                except ValueError:
+                    errors.append("%s: cell (%d, %d) is not a tile index: %r" % (name, row_pos, column_pos, column))
+                    continue
+
+                if index < 0 or index >= tile_count:
+                    errors.append("%s: cell (%d, %d) uses tile %d, the tileset has %d tiles" % (name, row_pos, column_pos, index, tile_count))
+
+
+def compute_reachability(colliders:List[List[str]], physics:dict):
+    """
+    Will build the jump-reachability graph of a level. The nodes are the cells
+    where the player can stand (an empty cell over a solid one) and there is an
+    edge between two of them if the player can walk, fall or jump from one to
+    the other. Jumps only take into account the ceiling right above the start,
+    so they may report some cells as reachable if there are obstacles in the
+    middle of the arc.
+    Returns a dictionary with the graph size, the spawn cell and the cells that
+    can't be reached from the spawn.
+    """
+    tilesize = physics["tilesize"]
+    profiles = physics["profiles"]
+    rows = len(colliders)
+    columns = max((len(row) for row in colliders), default=0)
+
+    def is_solid(row_pos, column_pos):
+        if row_pos < 0 or row_pos >= rows:
+            return False
+        row = colliders[row_pos]
+        return column_pos < len(row) and bool(row[column_pos])
+
+    # Find the cells where the player can stand
+    standing = set()
+    for row_pos in range(rows - 1):
+        for column_pos in range(columns):
+            if not is_solid(row_pos, column_pos) and is_solid(row_pos + 1, column_pos):
+                standing.add((row_pos, column_pos))
+
+    # How many tiles the player can move forward for each height difference
+    # (positive goes up) and each ceiling clearance
+    reach_tables = []
+    for profile in profiles:
+        table = {}
+        for rise in range(-rows, len(profiles)):
+            reach = get_reach(profile, rise * tilesize, physics["player_speed"], physics["gravity_speed"])
+            # At least half of the player has to be over the target
+            table[rise] = -1 if reach is None else int((reach + tilesize / 2) // tilesize)
+        reach_tables.append(table)
+    max_reach = max(max(table.values()) for table in reach_tables)
+
+    # Build the edges
+    edges = {}
+    for row_pos, column_pos in standing:
+        # Count the empty cells above the player
+        clearance = 0
+        while clearance < len(profiles) - 1 and row_pos - clearance - 1 >= 0 and not is_solid(row_pos - clearance - 1, column_pos):
+            clearance += 1
+        table = reach_tables[clearance]
+
+        targets = []
+        for target_row in range(max(row_pos - len(profiles) + 1, 0), rows):
+            for target_column in range(column_pos - max_reach, column_pos + max_reach + 1):
+                if (target_row, target_column) not in standing or (target_row, target_column) == (row_pos, column_pos):
+                    continue
+
+                distance = abs(target_column - column_pos)
+                rise = row_pos - target_row
+
+                # Walking to the next cell, or jumping/falling there
+                if (rise == 0 and distance == 1) or distance <= table[rise]:
+                    targets.append((target_row, target_column))
+
+        edges[(row_pos, column_pos)] = targets
+
+    # The player spawns at the top left corner and falls down
+    spawn = None
+    for row_pos in range(rows):
+        if (row_pos, 0) in standing:
+            spawn = (row_pos, 0)
+            break
+
+    # Walk the graph from the spawn
+    reachable = set()
+    if spawn is not None:
+        reachable.add(spawn)
+        pending = deque([spawn])
+        while pending:
+            for target in edges[pending.popleft()]:
+                if target not in reachable:
+                    reachable.add(target)
+                    pending.append(target)
+
+    unreachable = sorted(standing - reachable)
+    return {
+        "spawn": spawn,
+        "nodes": len(standing),
+        "edges": sum(len(targets) for targets in edges.values()),
+        "reachable": len(reachable),
+        "rightmost_column": max((column_pos for row_pos, column_pos in reachable), default=None),
+        "unreachable": [list(cell) for cell in unreachable[:MAX_LISTED_CELLS]],
+        "unreachable_count": len(unreachable),
+    }
+
+
+def validate_level(folder:str, tile_count:int, physics:dict):
+    """
+    Will validate a single level. This runs inside the process pool, so it
+    only uses the values it receives and does not touch pygame.
+    """
+    errors = []
+    warnings = []
+
+    # Load the layers
+    layers = {}
+    for name in LAYER_FILES:
+        filename = os.path.join(folder, name + ".csv")
+        try:
+            layers[name] = read_layer(filename)
+        except (OSError, csv.Error, ValueError) as error:
+            # ValueError also covers files that are not valid text
+            errors.append("%s: can't be read: %s" % (name, error))
+
+    check_shapes(layers, errors)
+    check_tiles(layers, tile_count, errors)
+
+    # The graph only makes sense if the colliders were loaded
+    reachability = None
+    if "colliders" in layers:
+        reachability = compute_reachability(layers["colliders"], physics)
+        if reachability["spawn"] is None:
+            warnings.append("there is no ground under the spawn point")
+        elif reachability["unreachable_count"]:
+            warnings.append("%d cells where the player can stand are unreachable" % reachability["unreachable_count"])
+
+    return {
+        "errors": errors,
+        "warnings": warnings,
+        "reachability": reachability,
+    }
+
+
+def hash_level(folder:str, parameters:str):
+    """
+    Returns a hash of the level files and the validation parameters.
+    """
+    digest = hashlib.sha256(parameters.encode())
+    for name in LAYER_FILES:
+        filename = os.path.join(folder, name + ".csv")
+        digest.update(name.encode())
+        try:
+            with open(filename, 'rb') as file:
+                digest.update(file.read())
+        except OSError:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+def find_levels(levels_folder:str):
+    """
+    Returns the folders inside levels_folder that have at least one of the
+    level files.
+    """
+    levels = []
+    for name in sorted(os.listdir(levels_folder)):
+        folder = os.path.join(levels_folder, name)
+        if os.path.isdir(folder) and any(os.path.exists(os.path.join(folder, layer + ".csv")) for layer in LAYER_FILES):
+            levels.append(folder)
+    return levels
+
+
+def load_cache(filename:str):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def validate_all(levels_folder:str, tileset_filename:str, cache_filename:str = None, workers:int = None):
+    """
+    Will validate every level in the folder and return a dictionary with the
+    results indexed by the level folder. Levels whose hash is in the cache are
+    not validated again.
+    """
+    tile_count = len(Tileset(tileset_filename, constants.TILESIZE).sprites)
+    physics = load_physics()
+    parameters = json.dumps([VALIDATOR_VERSION, tile_count, physics], sort_keys=True)
+
+    cache = load_cache(cache_filename) if cache_filename else {}
+
+    # Find out what needs to be validated
+    results = {}
+    hashes = {}
+    pending = []
+    for folder in find_levels(levels_folder):
+        hashes[folder] = hash_level(folder, parameters)
+        cached = cache.get(folder)
+        if cached is not None and cached["hash"] == hashes[folder]:
+            results[folder] = dict(cached["result"], cached=True)
+        else:
+            pending.append(folder)
+
+    # Validate the rest in parallel
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {folder: executor.submit(validate_level, folder, tile_count, physics) for folder in pending}
+            for folder, future in futures.items():
+                # A level that breaks the validator should not stop the others
+                try:
+                    result = future.result()
+                except Exception as error:
+                    results[folder] = {"errors": ["validation failed: %r" % error], "warnings": [], "reachability": None, "cached": False}
+                    continue
+
+                results[folder] = dict(result, cached=False)
+                cache[folder] = {"hash": hashes[folder], "result": result}
+
+    # Forget levels that no longer exist
+    for folder in list(cache.keys()):
+        if folder not in hashes:
+            del cache[folder]
+
+    if cache_filename:
+        with open(cache_filename, 'w') as file:
+            json.dump(cache, file)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validates the game levels.")
+    parser.add_argument("--levels", default=DEFAULT_LEVELS, help="folder with one folder per level")
+    parser.add_argument("--tileset", default=constants.FILEPATH_TILESET_MAIN, help="tileset used by the levels")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="file used to cache the results")
+    parser.add_argument("--no-cache", action="store_true", help="validate every level again")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = validate_all(args.levels, args.tileset, None if args.no_cache else args.cache, args.workers)
+
+    failed = False
+    for folder, result in sorted(results.items()):
+        status = "FAILED" if result["errors"] else "ok"
+        print("%s: %s%s" % (folder, status, " (cached)" if result["cached"] else ""))
+        for error in result["errors"]:
+            print("  error: %s" % error)
+        for warning in result["warnings"]:
+            print("  warning: %s" % warning)
+        failed = failed or bool(result["errors"])
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+This module has the level watcher, used to reload the levels while the game is
+running. It polls the modification time and size of the CSV files of a map
+and, when one of them changes, asks the layer to reload itself. The layers only
+update the cells that changed, so this is cheap even for big levels.
+
+Editors often truncate a file before writing it again, so a change is only
+applied once the file looks the same in two polls in a row.
+"""
+
+import os
+import csv
+import time
+
+from maps import Map, InvalidTileError
+
+
+class LevelWatcher:
+    """
+    Watches the files of all the layers of a map. It is meant to be polled
+    from the game loop, so the reload happens between frames and there is no
+    need to worry about threads.
+    """
+
+    def __init__(self, map:Map, interval:float = 0.5):
+        # Store values
+        self.map: Map = map
+        self.interval: float = interval
+
+        # Last time the files were checked
+        self.last_check: float = time.monotonic()
+
+        # Modification time and size of each file when it was last loaded,
+        # indexed by the file name
+        self.stats = {}
+        for layer in self.map.get_layers():
+            self.stats[layer.filename] = self.__get_stat(layer.filename)
+
+        # Changed files waiting for a second poll to confirm they are stable
+        self.pending = {}
+
+    def __get_stat(self, filename:str):
+        """
+        Returns the modification time and size of a file, or None if it can't
+        be read (editors sometimes remove the file before writing it again).
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """
+        Will check the files if the interval has passed and reload the layers
+        that changed. Returns a dictionary with the cells that changed in each
+        reloaded file.
+        """
+        now = time.monotonic()
+        if now - self.last_check < self.interval:
+            return {}
+        self.last_check = now
+
+        return self.check()
+
+    def check(self):
+        """
+        Will check the files right away, ignoring the interval.
+        """
+        changes = {}
+        for layer in self.map.get_layers():
+            stat = self.__get_stat(layer.filename)
+            if stat is None or stat == self.stats.get(layer.filename):
+                self.pending.pop(layer.filename, None)
+                continue
+
+            # Wait until the file stops changing
+            if self.pending.get(layer.filename) != stat:
+                self.pending[layer.filename] = stat
+                continue
+            del self.pending[layer.filename]
+
+            # The file may be broken, in which case the layer keeps its old
+            # tiles and the file is tried again when it changes
+            try:
+                changes[layer.filename] = layer.reload()
+            except (OSError, csv.Error, UnicodeDecodeError, InvalidTileError):
+                pass
+            self.stats[layer.filename] = stat
+
+        return changes